@@ -3,65 +3,293 @@ Test script for local development and API validation
 """
 import requests
 import argparse
-from pathlib import Path
-
-def test_health(api_base):
-    """Test health endpoint"""
-    print("Testing health endpoint...")
-    response = requests.get(f"{api_base}/")
-    print(f"Status: {response.status_code}")
-    print(f"Response: {response.json()}")
+import mmap
+import os
+import socket
+import time
+import uuid
+from urllib.parse import quote, unquote
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+
+try:
+    # C parser, several times faster than the stdlib json module
+    import orjson
+    json_loads = orjson.loads
+
+    def json_dumps(obj):
+        return orjson.dumps(obj).decode()
+except ImportError:
+    import json
+    json_loads = json.loads
+
+    def json_dumps(obj):
+        return json.dumps(obj, separators=(',', ':'))
+
+# Kernel send buffer for upload sockets, so large POSTs keep a WAN link full
+SEND_BUFFER_BYTES = 4 * 1024 * 1024
+
+# Files larger than one chunk are sent as parallel ranged PUTs
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+UPLOAD_WORKERS = 4
+
+# Transient gateway errors from the cloud host are retried with backoff
+# (0.3s, 0.6s, 1.2s). Chunk PUTs are safe to resend (the server counts a
+# range once), so a chunked upload only resends the failed chunk; POSTs
+# (uploads, /complete) are not idempotent and are never resent.
+RETRY = Retry(
+    total=3,
+    backoff_factor=0.3,
+    status_forcelist=[502, 503, 504],
+    allowed_methods=frozenset(['GET', 'HEAD', 'PUT']),
+    respect_retry_after_header=True,
+    # Hand the last error response back so the tests can report it
+    raise_on_status=False
+)
+
+# Client-observed round trip of every request, printed as JSON at the end
+TIMINGS = []
+
+# Endpoint URLs, formatted once from --api-base
+ApiUrls = namedtuple('ApiUrls', [
+    'health', 'upload', 'upload_form', 'upload_chunk', 'upload_complete', 'detect', 'detect_json'
+])
+
+def api_urls(api_base: str) -> ApiUrls:
+    """Every URL the tests call, for one API base"""
+    return ApiUrls(
+        health=f"{api_base}/health",
+        upload=f"{api_base}/api/upload_parquet_raw",
+        upload_form=f"{api_base}/api/upload_parquet",
+        upload_chunk=f"{api_base}/api/upload_parquet/chunk",
+        upload_complete=f"{api_base}/api/upload_parquet/complete",
+        detect=f"{api_base}/api/detect_outliers/stream",
+        detect_json=f"{api_base}/api/detect_outliers"
+    )
+
+class UploadAdapter(HTTPAdapter):
+    """HTTPAdapter whose sockets use TCP_NODELAY and a large send buffer"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        # urllib3's defaults already include TCP_NODELAY
+        kwargs['socket_options'] = HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_BYTES),
+        ]
+        super().init_poolmanager(*args, **kwargs)
+
+def create_session():
+    """Session with UploadAdapter mounted for both schemes"""
+    session = requests.Session()
+    # Room for concurrent files, each with its parallel upload chunks
+    adapter = UploadAdapter(pool_maxsize=32, max_retries=RETRY)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def timed(name: str, request, *args, **kwargs):
+    """
+    Make one HTTP call and record its client round trip in TIMINGS
+    (up to the response headers for stream=True calls)
+    """
+    start = time.perf_counter_ns()
+    response = request(*args, **kwargs)
+    TIMINGS.append({'request': name, 'status': response.status_code, 'client_rt_ns': time.perf_counter_ns() - start})
+    return response
+
+def test_health(urls, session, log=print):
+    """Test health endpoint (log lets a background run buffer its output)"""
+    log("Testing health endpoint...")
+    response = timed('health', session.get, urls.health)
+    log(f"Status: {response.status_code}")
+    log(f"Response: {json_loads(response.content)}")
     assert response.status_code == 200
-    print("✅ Health check passed\n")
+    log("✅ Health check passed\n")
+    return True
 
-def test_upload(file_path: str, api_base):
-    """Test file upload"""
-    print(f"Testing upload with {file_path}...")
+def upload_single(file_path: str, filename: str, urls, session):
+    """Send the file as one raw POST body, memory-mapped and streamed from the page cache"""
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as body:
+        return timed(
+            f"upload {filename}",
+            session.post,
+            urls.upload,
+            data=body,
+            headers={
+                'Content-Type': 'application/octet-stream',
+                'Content-Length': str(len(body)),
+                # Header values must be latin-1, so the name travels percent-encoded
+                'X-Filename': quote(filename)
+            },
+            stream=True
+        )
 
+def upload_chunk(file_path: str, urls, session, upload_id: str, offset: int, total: int):
+    """PUT one UPLOAD_CHUNK_BYTES range of the file"""
     with open(file_path, 'rb') as f:
-        files = {'file': (Path(file_path).name, f, 'application/octet-stream')}
-        response = requests.post(f"{api_base}/api/upload_parquet", files=files)
+        f.seek(offset)
+        data = f.read(UPLOAD_CHUNK_BYTES)
+
+    headers = {
+        'Content-Range': f"bytes {offset}-{offset + len(data) - 1}/{total}",
+        'X-Upload-Id': upload_id,
+    }
+    return timed(
+        f"upload_chunk {upload_id} {offset}",
+        session.put,
+        urls.upload_chunk,
+        data=data,
+        headers=headers
+    )
+
+def upload_chunked(file_path: str, filename: str, total: int, urls, session):
+    """Send the file as parallel ranged PUTs, then have the server assemble it"""
+    upload_id = uuid.uuid4().hex
+
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        responses = list(executor.map(
+            lambda offset: upload_chunk(file_path, urls, session, upload_id, offset, total),
+            range(0, total, UPLOAD_CHUNK_BYTES)
+        ))
 
-    print(f"Status: {response.status_code}")
+    for response in responses:
+        if response.status_code != 200:
+            return response
+
+    return timed(
+        f"upload_complete {filename}",
+        session.post,
+        urls.upload_complete,
+        params={'filename': filename, 'upload_id': upload_id},
+        stream=True
+    )
+
+def test_upload(file_path: str, urls, session, log=print, on_uploaded=None):
+    """Test file upload, calling on_uploaded(filename) as soon as the response headers arrive"""
+    log(f"Testing upload with {file_path}...")
+
+    filename = os.path.basename(file_path)
+    try:
+        size = os.stat(file_path).st_size
+        if size > UPLOAD_CHUNK_BYTES:
+            response = upload_chunked(file_path, filename, size, urls, session)
+        else:
+            response = upload_single(file_path, filename, urls, session)
+    except FileNotFoundError:
+        log(f"❌ File not found: {file_path}\n")
+        return None
+
+    log(f"Status: {response.status_code}")
     if response.status_code == 200:
-        data = response.json()
-        print(f"Filename: {data['filename']}")
-        print(f"Total rows: {data['total_rows']:,}")
-        print(f"Size: {data['total_size_bytes'] / 1024 / 1024:.2f} MB")
-        print(f"Partitions: {data['num_partitions']}")
-        print(f"Upload time: {data['upload_time_ms']:.2f} ms")
-        print("✅ Upload test passed\n")
+        # The body is still unread (stream=True): hand the file on first
+        if on_uploaded:
+            header = response.headers.get('X-Filename')
+            on_uploaded(unquote(header) if header is not None else filename)
+        data = json_loads(response.content)
+        # One write per block instead of one per line
+        log("\n".join((
+            f"Filename: {data['filename']}",
+            f"Total rows: {data['total_rows']:,}",
+            f"Size: {data['total_size_bytes'] / 1024 / 1024:.2f} MB",
+            f"Partitions: {data['num_partitions']}",
+            f"Upload time: {data['upload_time_ms']:.2f} ms",
+        )))
+        log("✅ Upload test passed\n")
         return data['filename']
     else:
-        print(f"❌ Upload failed: {response.text}\n")
+        log(f"❌ Upload failed: {response.text}\n")
         return None
 
-def test_detection(filename: str, api_base):
-    """Test outlier detection"""
-    print(f"Testing detection for {filename}...")
+def test_detection(filename: str, urls, session, log=print):
+    """Test outlier detection, returning whether it passed"""
+    log(f"Testing detection for {filename}...")
 
-    response = requests.get(f"{api_base}/api/detect_outliers", params={'filename': filename})
+    # NDJSON stream: one line per outlier as it arrives, then the timings
+    response = timed(
+        f"detect {filename}",
+        session.get,
+        urls.detect,
+        params={'filename': filename},
+        stream=True
+    )
 
-    print(f"Status: {response.status_code}")
+    log(f"Status: {response.status_code}")
     if response.status_code == 200:
-        data = response.json()
-        print(f"Download time: {data['download_time_ms']:.2f} ms")
-        print(f"Processing time: {data['processing_time_ms']:.2f} ms")
-        print(f"Total time: {data['total_time_ms']:.2f} ms")
-        print(f"Success: {data['success']}")
-        print(f"Message: {data['message']}")
-        print(f"Outliers found: {len(data['outliers'])}")
+        outliers = []
+        for line in response.iter_lines():
+            if line:
+                outliers.append(json_loads(line))
+        data = {**outliers.pop(), 'outliers': outliers}
+        # One write per block instead of one per line
+        log("\n".join((
+            f"Download time: {data['download_time_ms']:.2f} ms",
+            f"Processing time: {data['processing_time_ms']:.2f} ms",
+            f"Total time: {data['total_time_ms']:.2f} ms",
+            f"Success: {data['success']}",
+            f"Message: {data['message']}",
+            f"Outliers found: {len(data['outliers'])}",
+        )))
 
         if data['outliers']:
-            print("\nTop outlier:")
             outlier = data['outliers'][0]
-            print(f"  Distance: {outlier['trip_distance']:.2f} miles")
-            print(f"  Duration: {outlier['trip_duration_hours']:.2f} hours")
-            print(f"  Speed: {outlier['avg_speed_mph']:.2f} mph")
+            log("\n".join((
+                "\nTop outlier:",
+                f"  Distance: {outlier['trip_distance']:.2f} miles",
+                f"  Duration: {outlier['trip_duration_hours']:.2f} hours",
+                f"  Speed: {outlier['avg_speed_mph']:.2f} mph",
+            )))
+
+        # The frontend reads the plain JSON endpoint: it must agree with the stream
+        plain = timed(f"detect_json {filename}", session.get, urls.detect_json, params={'filename': filename})
+        if plain.status_code != 200 or json_loads(plain.content)['outliers'] != outliers:
+            log(f"❌ /api/detect_outliers differs from the stream ({plain.status_code}): {plain.text[:200]}\n")
+            return False
 
-        print("✅ Detection test passed\n")
+        log("✅ Detection test passed\n")
+        return True
     else:
-        print(f"❌ Detection failed: {response.text}\n")
+        log(f"❌ Detection failed: {response.text}\n")
+        return False
+
+def test_form_upload(file_path: str, urls, session, log=print):
+    """Upload through the multipart endpoint the frontend uses, returning whether it passed"""
+    log(f"Testing multipart upload with {file_path}...")
+
+    filename = os.path.basename(file_path)
+    with open(file_path, 'rb') as f:
+        # requests builds the whole multipart body in memory
+        response = timed(
+            f"upload_form {filename}",
+            session.post,
+            urls.upload_form,
+            files={'file': (filename, f, 'application/octet-stream')}
+        )
+
+    log(f"Status: {response.status_code}")
+    header = response.headers.get('X-Filename')
+    if response.status_code == 200 and header is not None and unquote(header) == filename:
+        log("✅ Multipart upload test passed\n")
+        return True
+    else:
+        log(f"❌ Multipart upload failed: {response.text}\n")
+        return False
+
+def test_file(file_path: str, urls, session, log=print):
+    """Upload one file, then detect its outliers if the upload worked; True if both passed"""
+    # Detection overlaps parsing the upload body; its output follows the upload's
+    detection_log = []
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        detections = []
+        test_upload(file_path, urls, session, log, lambda filename: detections.append(
+            executor.submit(test_detection, filename, urls, session, detection_log.append)
+        ))
+        passed = [detection.result() for detection in detections]
+    for block in detection_log:
+        log(block)
+    return passed == [True]
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -73,33 +301,67 @@ if __name__ == "__main__":
 
   # Test on production
   python test_api.py --api-base https://your-app.fly.dev parquets_optimized/yellow_tripdata_2023-01.parquet
+
+  # Test several files concurrently
+  python test_api.py parquets_optimized/yellow_tripdata_2023-*.parquet
 '''
     )
-    parser.add_argument('file_path', help='Path to the parquet file to test')
+    parser.add_argument('file_paths', nargs='+', metavar='file_path', help='Path(s) to the parquet file(s) to test')
     parser.add_argument(
         '--api-base',
         default='http://localhost:8080',
         help='Base URL of the API (default: http://localhost:8080)'
     )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=4,
+        help='Files tested at the same time (default: 4)'
+    )
 
     args = parser.parse_args()
+    urls = api_urls(args.api_base)
+
+    print("\n".join((
+        "=" * 60,
+        "NYC Outliers Detector - API Tests",
+        f"API Base: {args.api_base}",
+        "=" * 60 + "\n",
+    )))
+
+    # Run tests over one pooled keep-alive session
+    with create_session() as session, ThreadPoolExecutor(max_workers=args.concurrency + 1) as executor:
+        # Health check overlaps the uploads, and files run concurrently;
+        # each one's output is buffered and printed as a block, in order
+        health_log = []
+        health = executor.submit(test_health, urls, session, health_log.append)
 
-    if not Path(args.file_path).exists():
-        print(f"❌ File not found: {args.file_path}")
-        parser.exit(1)
+        file_logs = [[] for _ in args.file_paths]
+        runs = [
+            executor.submit(test_file, file_path, urls, session, log.append)
+            for file_path, log in zip(args.file_paths, file_logs)
+        ]
 
-    print("=" * 60)
-    print("NYC Outliers Detector - API Tests")
-    print(f"API Base: {args.api_base}")
-    print("=" * 60 + "\n")
+        def passed(future, log):
+            """Wait for one test and print its buffered output; False if it failed"""
+            try:
+                return bool(future.result())
+            except Exception as e:
+                log.append(f"❌ {type(e).__name__}: {e}\n")
+                return False
+            finally:
+                print("\n".join(log))
 
-    # Run tests
-    test_health(args.api_base)
-    filename = test_upload(args.file_path, args.api_base)
+        # A failed file (missing, upload or detection error) doesn't stop the others
+        failures = sum(not passed(future, log) for future, log in [(health, health_log), *zip(runs, file_logs)])
 
-    if filename:
-        test_detection(filename, args.api_base)
+        # The frontend's multipart upload, once, after the runs so it never races them
+        form_path = next((path for path in args.file_paths if os.path.isfile(path)), None)
+        if form_path:
+            form_log = []
+            failures += not passed(executor.submit(test_form_upload, form_path, urls, session, form_log.append), form_log)
 
-    print("=" * 60)
-    print("All tests completed!")
-    print("=" * 60)
+    print("\n".join(("=" * 60, "All tests completed!", "=" * 60)))
+    print(json_dumps(TIMINGS))
+    if failures:
+        parser.exit(1, f"❌ {failures} test(s) failed\n")